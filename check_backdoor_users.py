@@ -3,45 +3,78 @@
 # 运行方式：需以管理员权限运行
 
 import subprocess
-import re
+import ctypes
+import functools
+import json
 import sys
 
+# 内置账户，不视为自定义管理员
+BUILTIN_ACCOUNTS = ['Administrator', 'Guest', 'DefaultAccount', 'WDAGUtilityAccount']
+
+# 本地管理员组的固定 SID（不受系统语言影响）
+ADMINISTRATORS_SID = 'S-1-5-32-544'
+
+# 以字符串形式输出 SID 的 PowerShell 计算属性
+SID_PROPERTY = "@{n='SID';e={$_.SID.Value}}"
+
+# 通过 ADSI 枚举管理员组成员的 SID：只读取 objectSid，不做名称解析，
+# 因此孤立 SID 和 Azure AD 角色 SID（S-1-12-1-...）不会导致报错
+ADSI_ADMIN_SIDS_SCRIPT = (
+    f"$group = (New-Object System.Security.Principal.SecurityIdentifier('{ADMINISTRATORS_SID}'))"
+    ".Translate([System.Security.Principal.NTAccount]).Value.Split('\\')[-1]; "
+    "@(([ADSI]('WinNT://./' + $group + ',group')).psbase.Invoke('Members') | ForEach-Object { "
+    "$bytes = $_.GetType().InvokeMember('objectSid', 'GetProperty', $null, $_, $null); "
+    "[pscustomobject]@{ SID = (New-Object System.Security.Principal.SecurityIdentifier($bytes, 0)).Value } })"
+)
+
+
+@functools.lru_cache(maxsize=1)
 def is_admin():
-    """检查是否以管理员权限运行"""
+    """检查是否以管理员权限运行（结果缓存，只查询一次）"""
     try:
-        return subprocess.check_output(['net', 'session'], stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
-    except subprocess.CalledProcessError:
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+    except (AttributeError, OSError):
         return False
 
+def run_powershell_json(command):
+    """执行 PowerShell 命令，并将结果以 JSON 解析为字典列表"""
+    # 强制 UTF-8 输出，避免中文用户名在 GBK 控制台下乱码
+    script = f"[Console]::OutputEncoding = [System.Text.Encoding]::UTF8; {command} | ConvertTo-Json"
+    # 直接以参数列表启动 powershell.exe，不经过 cmd.exe；关闭 stdin 防止其等待输入
+    result = subprocess.run(['powershell', '-NoProfile', '-NonInteractive', '-Command', script],
+                            capture_output=True, stdin=subprocess.DEVNULL)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'ignore').strip())
+    # json.loads 直接接受 UTF-8 字节（含 BOM），无需先整体解码
+    output = result.stdout.strip()
+    if not output:
+        return []
+    data = json.loads(output)
+    # 只有一个对象时 ConvertTo-Json 不会输出数组
+    return data if isinstance(data, list) else [data]
+
 def get_users():
-    """获取所有用户列表"""
+    """获取所有用户列表（一次 PowerShell 调用）"""
     try:
-        result = subprocess.check_output('net user', shell=True, text=True, encoding='gbk', errors='ignore')
-        lines = result.splitlines()
-        users = []
-        capture = False
-        for line in lines:
-            if '----------' in line:
-                capture = True
-                continue
-            if capture and line.strip() and not line.startswith('命令成功完成'):
-                # 提取用户名（可能有多个）
-                names = re.split(r'\s{2,}', line.strip())
-                for name in names:
-                    if name:
-                        users.append(name.strip())
-        return users
+        return run_powershell_json(f'Get-LocalUser | Select-Object Name,Enabled,PasswordLastSet,LastLogon,{SID_PROPERTY}')
     except Exception as e:
         print(f"获取用户列表失败: {e}")
         return []
 
-def get_user_info(username):
-    """获取指定用户详细信息"""
+def get_administrators():
+    """获取管理员组成员的 SID 集合（一次 PowerShell 调用），失败时返回 None"""
     try:
-        result = subprocess.check_output(f'net user "{username}"', shell=True, text=True, encoding='gbk', errors='ignore')
-        return result
+        members = run_powershell_json(f'Get-LocalGroupMember -SID {ADMINISTRATORS_SID} | Select-Object {SID_PROPERTY}')
     except Exception as e:
-        return ""
+        # 组内存在无法解析的成员时 Get-LocalGroupMember 会报错，改用 ADSI 枚举
+        print(f"⚠️  Get-LocalGroupMember 执行失败，改用 ADSI 查询管理员组: {e}")
+        try:
+            members = run_powershell_json(ADSI_ADMIN_SIDS_SCRIPT)
+        except Exception as e:
+            print(f"获取管理员组成员失败: {e}")
+            return None
+    # 按 SID 比较，避免域账户 CORP\alice 被误认为本地用户 alice
+    return {m['SID'] for m in members if m.get('SID')}
 
 def is_hidden_user(username):
     """判断是否为隐藏用户（以$结尾）"""
@@ -49,32 +82,20 @@ def is_hidden_user(username):
 
 def is_builtin_admin(username):
     """判断是否为内置管理员（如Administrator）"""
-    builtin = ['Administrator', 'Guest', 'DefaultAccount', 'WDAGUtilityAccount']
-    return username in builtin
-
-def is_member_of_administrators(username):
-    """检查用户是否属于管理员组"""
-    try:
-        result = subprocess.check_output(f'net user "{username}"', shell=True, text=True, encoding='gbk', errors='ignore')
-        return 'Administrators' in result or '管理员' in result
-    except:
-        return False
+    return username in BUILTIN_ACCOUNTS
 
-def check_suspicious_user(username):
+def check_suspicious_user(user, administrators):
     """检查用户是否可疑"""
-    info = get_user_info(username)
+    username = user['Name']
     suspicious = []
 
     if is_hidden_user(username):
         suspicious.append("隐藏账户（用户名以$结尾）")
 
-    if is_member_of_administrators(username) and not is_builtin_admin(username):
+    if user.get('SID') in administrators and not is_builtin_admin(username):
         suspicious.append("自定义管理员账户")
 
-    # 检查是否为新创建的账户（可根据时间判断，此处简化）
-    if '创建时间' in info:
-        # 可进一步解析创建时间，判断是否为近期创建
-        pass
+    # 检查是否为新创建的账户（可根据 PasswordLastSet 判断，此处简化）
 
     return suspicious
 
@@ -93,9 +114,14 @@ def main():
         print("❌ 未能获取用户列表，请检查权限或系统环境。")
         sys.exit(1)
 
+    administrators = get_administrators()
+    if administrators is None:
+        print("❌ 未能获取管理员组成员，无法判断自定义管理员账户，请检查系统环境。")
+        sys.exit(1)
+
     print(f"✅ 共发现 {len(users)} 个用户账户：")
     for user in users:
-        print(f"  - {user}")
+        print(f"  - {user['Name']}")
 
     print("\n" + "-" * 60)
     print("🚨 检查可疑账户...")
@@ -103,10 +129,10 @@ def main():
 
     found_suspicious = False
     for user in users:
-        issues = check_suspicious_user(user)
+        issues = check_suspicious_user(user, administrators)
         if issues:
             found_suspicious = True
-            print(f"⚠️  警告：用户 [{user}] 存在可疑特征：")
+            print(f"⚠️  警告：用户 [{user['Name']}] 存在可疑特征：")
             for issue in issues:
                 print(f"     🔸 {issue}")
 
@@ -1,11 +1,28 @@
 # check_suspicious_processes.py
 # 功能：检查Windows系统中可疑的异常进程
 # 需要安装 psutil: pip install psutil
+# 可选安装 pyahocorasick 加速关键词匹配: pip install pyahocorasick
+# 可选安装 google-re2 保证正则匹配为线性时间: pip install google-re2
 
 import psutil
+import ctypes
 import os
 import re
 import sys
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+
+try:
+    import ahocorasick
+except ImportError:  # 未安装时回退到正则匹配
+    ahocorasick = None
+
+try:
+    import re2
+except ImportError:  # 未安装时使用标准库 re
+    re2 = None
 
 # 常见的恶意进程名称或关键词（可扩展）
 MALICIOUS_KEYWORDS = [
@@ -37,65 +54,164 @@ HIGH_RISK_PATHS = [
     '\\AppData\\Roaming\\', '\\Local\\Programs\\', '.cache'
 ]
 
+# 并发查询进程信息的线程数（逐进程的系统调用会释放 GIL）
+MAX_WORKERS = 8
+
+# NtQuerySystemInformation 相关常量
+_SYSTEM_PROCESS_INFORMATION_CLASS = 5
+_STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+
+
+class _UNICODE_STRING(ctypes.Structure):
+    _fields_ = [
+        ('Length', ctypes.c_uint16),
+        ('MaximumLength', ctypes.c_uint16),
+        ('Buffer', ctypes.c_void_p),
+    ]
+
+
+class _SYSTEM_PROCESS_INFORMATION(ctypes.Structure):
+    # 只声明到 UniqueProcessId 为止，后续字段不需要
+    _fields_ = [
+        ('NextEntryOffset', ctypes.c_uint32),
+        ('NumberOfThreads', ctypes.c_uint32),
+        ('Reserved1', ctypes.c_int64 * 3),
+        ('CreateTime', ctypes.c_int64),
+        ('UserTime', ctypes.c_int64),
+        ('KernelTime', ctypes.c_int64),
+        ('ImageName', _UNICODE_STRING),
+        ('BasePriority', ctypes.c_int32),
+        ('UniqueProcessId', ctypes.c_void_p),
+    ]
+
+
+# 预编译的匹配规则（模块加载时构建一次，避免逐进程重复循环）
+# 关键词/路径的多选匹配优先使用 RE2（基于 DFA，无回溯）
+_regex = re2 if re2 is not None else re
+_MAL_RE = _regex.compile('(?i)' + '|'.join(map(_regex.escape, MALICIOUS_KEYWORDS)))
+_RISK_RE = _regex.compile('(?i)' + '|'.join(map(_regex.escape, HIGH_RISK_PATHS)))
+_MAL_AC = None
+if ahocorasick is not None:
+    # 多关键词自动机：单次扫描即可找出所有关键词，与关键词数量无关
+    _MAL_AC = ahocorasick.Automaton()
+    for _kw in MALICIOUS_KEYWORDS:
+        _MAL_AC.add_word(_kw.lower(), _kw.lower())
+    _MAL_AC.make_automaton()
+_SYSTEM_PATHS_NORM = tuple(os.path.normpath(p).lower() for p in SYSTEM_PATHS)
+# 只应出现在系统路径下的进程名
+_SYS_NAME_SET = frozenset(SUSPICIOUS_NAMES) | {'dllhost.exe'}
+# 仿冒名称 -> 被仿冒的系统进程名
+_BAD_VARIANTS = {v.lower(): good for good, variants in SUSPICIOUS_NAMES.items() for v in variants}
+
 
 def is_system_process(proc_path):
     """判断是否为系统可信路径"""
     if not proc_path:
         return False
-    proc_path = os.path.normpath(proc_path).lower()
-    for trusted in SYSTEM_PATHS:
-        if proc_path.startswith(os.path.normpath(trusted).lower()):
-            return True
-    return False
-
-
-def is_suspicious_name(process_name):
-    """检查进程名是否是仿冒系统进程"""
-    issues = []
-    for good_name, bad_variants in SUSPICIOUS_NAMES.items():
-        if process_name.lower() in [v.lower() for v in bad_variants]:
-            issues.append(f"疑似仿冒 {good_name}")
-    return issues
-
-
-def has_malicious_keyword(process_name, proc_path=""):
-    """检查是否包含恶意关键词"""
-    full_text = (process_name + " " + proc_path).lower()
-    found = []
-    for keyword in MALICIOUS_KEYWORDS:
-        if keyword.lower() in full_text:
-            found.append(keyword)
-    return found
-
-
-def is_high_risk_path(proc_path):
-    """检查是否在高风险路径运行"""
-    if not proc_path:
-        return False
-    proc_path = proc_path.lower()
-    for risk_path in HIGH_RISK_PATHS:
-        if risk_path.lower() in proc_path:
-            return True
-    return False
+    return os.path.normpath(proc_path).lower().startswith(_SYSTEM_PATHS_NORM)
+
+
+def _row_starts(column):
+    """计算每行文本在以 \\x00 拼接后的整段文本中的起始偏移"""
+    return list(accumulate((len(text) + 1 for text in column), initial=0))
+
+
+def find_malicious_keywords(texts):
+    """对整列文本只扫描一次，返回每行命中的恶意关键词列表"""
+    # 逐行转小写后再拼接，保证偏移与行的对应关系不变
+    lowered = [text.lower() for text in texts]
+    starts = _row_starts(lowered)
+    joined = '\x00'.join(lowered)
+    if _MAL_AC is None:
+        # 正则只用于快速筛选：finditer 不返回重叠匹配（如 hackeylog 中的 keylog），
+        # 命中的行再逐个关键词确认
+        flagged = {bisect_right(starts, m.start()) - 1 for m in _MAL_RE.finditer(joined)}
+        return [[kw for kw in MALICIOUS_KEYWORDS if kw.lower() in text] if i in flagged else []
+                for i, text in enumerate(lowered)]
+    hits = [set() for _ in texts]
+    for pos, keyword in _MAL_AC.iter(joined):
+        hits[bisect_right(starts, pos) - 1].add(keyword)
+    # 按 MALICIOUS_KEYWORDS 的顺序输出，与未安装 pyahocorasick 时一致
+    return [[kw for kw in MALICIOUS_KEYWORDS if kw.lower() in found] if found else [] for found in hits]
+
+
+def find_high_risk_paths(paths):
+    """对整列路径只扫描一次，返回每行是否位于高风险路径"""
+    starts = _row_starts(paths)
+    mask = [False] * len(paths)
+    for m in _RISK_RE.finditer('\x00'.join(paths)):
+        mask[bisect_right(starts, m.start()) - 1] = True
+    return mask
+
+
+def query_process_names():
+    """通过一次 NtQuerySystemInformation 调用获取所有进程的 PID 和名称
+
+    返回 {pid: name}，非 Windows 系统或调用失败时返回 None
+    """
+    if os.name != 'nt':
+        return None
+    ntdll = ctypes.WinDLL('ntdll')
+    query = ntdll.NtQuerySystemInformation
+    query.argtypes = [ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32)]
+    query.restype = ctypes.c_int32
+
+    # 进程列表大小未知，缓冲区不足时按返回的长度扩大后重试
+    size = 0x40000
+    while True:
+        buf = ctypes.create_string_buffer(size)
+        needed = ctypes.c_uint32()
+        status = query(_SYSTEM_PROCESS_INFORMATION_CLASS, buf, size, ctypes.byref(needed)) & 0xFFFFFFFF
+        if status == _STATUS_INFO_LENGTH_MISMATCH:
+            size = max(size * 2, needed.value + 0x10000)
+            continue
+        if status != 0:
+            return None
+        break
+
+    names = {}
+    offset = 0
+    while True:
+        info = _SYSTEM_PROCESS_INFORMATION.from_buffer(buf, offset)
+        pid = info.UniqueProcessId or 0
+        if info.ImageName.Buffer:
+            names[pid] = ctypes.wstring_at(info.ImageName.Buffer, info.ImageName.Length // 2)
+        else:
+            names[pid] = "System Idle Process"
+        if not info.NextEntryOffset:
+            break
+        offset += info.NextEntryOffset
+    return names
+
+
+def _fetch_process(pid, name=None):
+    """查询单个进程的信息，进程已退出时返回 None"""
+    # 已从系统快照中拿到名称时，只需再查询路径和用户
+    attrs = ['exe', 'username'] if name else ['name', 'exe', 'username']
+    try:
+        # 无权限读取的字段返回 None，而不是丢弃整个进程
+        info = psutil.Process(pid).as_dict(attrs)
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return None
+    name = name or info.get('name') or ""
+    return {
+        'pid': pid,
+        'name': name,
+        'name_lower': name.lower(),
+        'exe': info['exe'] or "Unknown",
+        'username': info['username']
+    }
 
 
 def get_running_processes():
-    """获取所有正在运行的进程信息"""
-    processes = []
-    for proc in psutil.process_iter(['pid', 'name', 'exe', 'username']):
-        try:
-            exe = proc.info['exe'] or "Unknown"
-            name = proc.info['name']
-            username = proc.info['username']
-            processes.append({
-                'pid': proc.info['pid'],
-                'name': name,
-                'exe': exe,
-                'username': username
-            })
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return processes
+    """逐个产出正在运行的进程信息"""
+    names = query_process_names()
+    if names is None:
+        names = dict.fromkeys(psutil.pids())
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for proc in executor.map(_fetch_process, names.keys(), names.values()):
+            if proc is not None:
+                yield proc
 
 
 def main():
@@ -103,57 +219,72 @@ def main():
     print("🔍 正在扫描可疑进程...")
     print("=" * 60)
 
-    all_processes = get_running_processes()
-    print(f"✅ 共发现 {len(all_processes)} 个运行中的进程。")
-
-    # 统计同名进程数量
-    name_count = {}
-    for p in all_processes:
-        name_count[p['name']] = name_count.get(p['name'], 0) + 1
-
-    suspicious_found = False
+    # 边采集边统计同名进程数量，进程信息按列保存
+    name_count = Counter()
+    pids, names, names_lower, exes, usernames = [], [], [], [], []
+    for proc in get_running_processes():
+        name_count[proc['name']] += 1
+        pids.append(proc['pid'])
+        names.append(proc['name'])
+        names_lower.append(proc['name_lower'])
+        exes.append(proc['exe'])
+        usernames.append(proc['username'])
+    print(f"✅ 共发现 {len(pids)} 个运行中的进程。")
+
+    # 关键词与高风险路径按列整体扫描，避免逐进程调用
+    keyword_hits = find_malicious_keywords([f"{name} {exe}" for name, exe in zip(names, exes)])
+    high_risk = find_high_risk_paths(exes)
+    is_bad_variant = [name_lower in _BAD_VARIANTS for name_lower in names_lower]
+    is_sys_name = [name_lower in _SYS_NAME_SET for name_lower in names_lower]
+    is_crowded = [name_count[name] > 3 for name in names]  # 超过3个视为可疑
+
+    # 只对命中任一项的进程逐个生成告警
+    candidates = [i for i, flags in enumerate(zip(is_bad_variant, keyword_hits, high_risk, is_sys_name, is_crowded))
+                  if any(flags)]
+
+    # 警告内容先缓存，检查结束后一次性输出
+    report = []
 
     print("\n" + "-" * 60)
     print("🚨 检查可疑进程...")
     print("-" * 60)
 
-    for proc in all_processes:
+    for i in candidates:
+        name, name_lower, exe = names[i], names_lower[i], exes[i]
         issues = []
 
         # 1. 检查是否仿冒系统进程名
-        name_issues = is_suspicious_name(proc['name'])
-        if name_issues:
-            issues.extend(name_issues)
+        if is_bad_variant[i]:
+            issues.append(f"疑似仿冒 {_BAD_VARIANTS[name_lower]}")
 
         # 2. 检查恶意关键词
-        keywords = has_malicious_keyword(proc['name'], proc['exe'])
+        keywords = keyword_hits[i]
         if keywords:
             issues.append(f"包含恶意关键词: {', '.join(keywords)}")
 
         # 3. 检查高风险路径
-        if is_high_risk_path(proc['exe']):
-            issues.append(f"运行于高风险路径: {proc['exe']}")
+        if high_risk[i]:
+            issues.append(f"运行于高风险路径: {exe}")
 
         # 4. 非系统路径运行的系统级进程名（如 svchost 在 Temp）
-        if proc['name'].lower() in SUSPICIOUS_NAMES.keys() or proc['name'].lower() in ['dllhost.exe']:
-            if not is_system_process(proc['exe']):
-                issues.append(f"系统进程名但不在系统路径: {proc['exe']}")
+        if is_sys_name[i]:
+            if not is_system_process(exe):
+                issues.append(f"系统进程名但不在系统路径: {exe}")
 
         # 5. 多个同名非系统进程（如多个 python.exe 在用户目录）
-        if name_count[proc['name']] > 3:  # 超过3个视为可疑
-            if is_high_risk_path(proc['exe']) or 'python' in proc['name'].lower():
-                issues.append(f"存在 {name_count[proc['name']]} 个同名进程，可能异常")
+        if is_crowded[i]:
+            if high_risk[i] or 'python' in name_lower:
+                issues.append(f"存在 {name_count[name]} 个同名进程，可能异常")
 
-        # 输出警告
+        # 记录警告
         if issues:
-            suspicious_found = True
-            print(f"⚠️  PID [{proc['pid']}] 名称 [{proc['name']}] 用户: {proc['username']}")
-            for issue in issues:
-                print(f"     🔸 {issue}")
+            report.append(f"⚠️  PID [{pids[i]}] 名称 [{name}] 用户: {usernames[i]}")
+            report.extend(f"     🔸 {issue}" for issue in issues)
 
-    if not suspicious_found:
+    if not report:
         print("✅ 未发现明显可疑进程。")
     else:
+        print("\n".join(report))
         print("\n🔔 建议：对上述进程进行进一步调查，可通过任务管理器或杀毒软件分析。")
 
     print("\n" + "=" * 60)
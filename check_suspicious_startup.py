@@ -1,11 +1,25 @@
 # check_suspicious_startup.py
 # 功能：检查Windows系统中的异常启动项（注册表 + 启动文件夹）
 # 需要管理员权限运行
+# 可选安装 pyahocorasick 加速关键词匹配: pip install pyahocorasick
+# 可选安装 google-re2 保证正则匹配为线性时间: pip install google-re2
 
 import winreg
+import ctypes
+import functools
 import os
+import re
 import sys
-import glob
+
+try:
+    import ahocorasick
+except ImportError:  # 未安装时回退到正则匹配
+    ahocorasick = None
+
+try:
+    import re2
+except ImportError:  # 未安装时使用标准库 re
+    re2 = None
 
 # 常见恶意关键词
 MALICIOUS_KEYWORDS = ['hack', 'keylog', 'spy', 'remote', 'rat', 'trojan', 'backdoor', 'shell', 'vnc', 'miner']
@@ -27,42 +41,78 @@ SUSPICIOUS_NAMES = [
     'svchost', 'explorer', 'winlogon', 'lsass', 'csrss', 'smss'
 ]
 
+# 启动文件夹中需要检查的文件类型
+STARTUP_EXTENSIONS = {'.exe', '.bat', '.vbs', '.ps1', '.lnk', '.cmd'}
+
+# 启动文件夹（环境变量在加载时展开一次）
+STARTUP_FOLDERS = [
+    # 用户启动文件夹
+    ('User Startup', os.path.expandvars(r"%APPDATA%\Microsoft\Windows\Start Menu\Programs\Startup")),
+    # 全局启动文件夹
+    ('Common Startup', os.path.expandvars(r"%PROGRAMDATA%\Microsoft\Windows\Start Menu\Programs\Startup")),
+]
+
+# 预编译的匹配规则（模块加载时构建一次，避免逐项重复循环）
+# 关键词/路径的多选匹配优先使用 RE2（基于 DFA，无回溯）
+_regex = re2 if re2 is not None else re
+_MAL_RE = _regex.compile('(?i)' + '|'.join(map(_regex.escape, MALICIOUS_KEYWORDS)))
+_RISK_RE = _regex.compile('(?i)' + '|'.join(map(_regex.escape, HIGH_RISK_PATHS)))
+_TRUSTED_PATHS_NORM = tuple(os.path.normpath(p).lower() for p in TRUSTED_PATHS)
+_SYS_RE = re.compile('|'.join(map(re.escape, SUSPICIOUS_NAMES)))
+# 仿冒名称中常见的替换字符（0 代替 o、1 代替 l、多余的下划线）
+_SUSP_CHARS = re.compile(r'[01_]')
+# 从启动命令中提取可执行文件路径（如 "C:\xxx\abc.exe" 参数 -> 提取带exe的部分）
+_EXE_PATH_RE = re.compile(r'(["\']?)([A-Za-z]:\\[^"\']+\.(?:exe|bat|vbs|ps1|cmd))\1', re.IGNORECASE)
+_MAL_AC = None
+if ahocorasick is not None:
+    # 多关键词自动机：单次扫描即可找出所有关键词，与关键词数量无关
+    _MAL_AC = ahocorasick.Automaton()
+    for _kw in MALICIOUS_KEYWORDS:
+        _MAL_AC.add_word(_kw.lower(), _kw.lower())
+    _MAL_AC.make_automaton()
+
+
+@functools.lru_cache(maxsize=1)
+def is_admin():
+    """检查是否以管理员权限运行（结果缓存，只查询一次）"""
+    try:
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+    except (AttributeError, OSError):
+        return False
+
 
 def is_high_risk_path(path):
     """判断路径是否在高风险目录"""
     if not path:
         return False
-    path = path.lower()
-    for risk in HIGH_RISK_PATHS:
-        if risk.lower() in path:
-            return True
-    return False
+    return bool(_RISK_RE.search(path))
 
 
 def is_trusted_path(path):
     """判断是否为可信路径"""
     if not path:
         return False
-    path = os.path.normpath(path).lower()
-    for trusted in TRUSTED_PATHS:
-        if path.startswith(os.path.normpath(trusted).lower()):
-            return True
-    return False
+    return os.path.normpath(path).lower().startswith(_TRUSTED_PATHS_NORM)
 
 
 def has_malicious_keyword(text):
     """检查是否包含恶意关键词"""
     text = text.lower()
-    return [kw for kw in MALICIOUS_KEYWORDS if kw.lower() in text]
+    if _MAL_AC is None:
+        # 正则只用于快速筛选：findall 不返回重叠匹配（如 piratrojan 中的 trojan），
+        # 命中后再逐个关键词确认
+        if not _MAL_RE.search(text):
+            return []
+        return [kw for kw in MALICIOUS_KEYWORDS if kw.lower() in text]
+    found = {kw for _, kw in _MAL_AC.iter(text)}
+    # 按 MALICIOUS_KEYWORDS 的顺序输出，与未安装 pyahocorasick 时一致
+    return [kw for kw in MALICIOUS_KEYWORDS if kw.lower() in found]
 
 
 def is_suspicious_name(name):
     """检查名称是否仿冒系统进程"""
     name_lower = name.lower()
-    for sys_name in SUSPICIOUS_NAMES:
-        if sys_name in name_lower and (name_lower.count('0') or name_lower.count('1') or '_' in name_lower):
-            return True
-    return False
+    return bool(_SYS_RE.search(name_lower) and _SUSP_CHARS.search(name_lower))
 
 
 def query_registry_run_keys():
@@ -79,19 +129,19 @@ def query_registry_run_keys():
     for hkey, subkey in reg_paths:
         try:
             with winreg.OpenKey(hkey, subkey, 0, winreg.KEY_READ) as key:
-                i = 0
-                while True:
+                # 先取得值的数量，避免靠 EnumValue 抛出异常来判断枚举结束
+                _, value_count, _ = winreg.QueryInfoKey(key)
+                for i in range(value_count):
                     try:
                         name, value, _ = winreg.EnumValue(key, i)
-                        startup_items.append({
-                            'type': 'Registry',
-                            'name': name,
-                            'value': value,
-                            'path': subkey
-                        })
-                        i += 1
                     except OSError:
-                        break  # 枚举结束
+                        break  # 枚举期间值被删除
+                    startup_items.append({
+                        'type': 'Registry',
+                        'name': name,
+                        'value': value,
+                        'path': subkey
+                    })
         except PermissionError:
             print(f"⚠️  无权限访问注册表路径: {subkey}")
         except Exception as e:
@@ -103,25 +153,25 @@ def query_registry_run_keys():
 def get_startup_folder_items():
     """获取启动文件夹中的快捷方式或可执行文件"""
     startup_items = []
-    # 用户启动文件夹
-    user_startup = os.path.expandvars(r"%APPDATA%\Microsoft\Windows\Start Menu\Programs\Startup")
-    # 全局启动文件夹
-    common_startup = os.path.expandvars(r"%PROGRAMDATA%\Microsoft\Windows\Start Menu\Programs\Startup")
-
-    folders = [('User Startup', user_startup), ('Common Startup', common_startup)]
-
-    for location, folder_path in folders:
-        if not os.path.exists(folder_path):
+    for location, folder_path in STARTUP_FOLDERS:
+        try:
+            entries = os.scandir(folder_path)
+        except FileNotFoundError:
+            continue
+        except PermissionError:
+            print(f"⚠️  无权限访问启动文件夹: {folder_path}")
             continue
-        # 查找 .exe, .bat, .vbs, .lnk 等可疑文件
-        patterns = ['*.exe', '*.bat', '*.vbs', '*.ps1', '*.lnk', '*.cmd']
-        for pattern in patterns:
-            for file_path in glob.glob(os.path.join(folder_path, pattern)):
-                if os.path.isfile(file_path):
+        except OSError as e:
+            print(f"❌ 访问启动文件夹失败 {folder_path}: {e}")
+            continue
+        # 单次遍历目录，查找 .exe, .bat, .vbs, .lnk 等可疑文件
+        with entries:
+            for entry in entries:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in STARTUP_EXTENSIONS:
                     startup_items.append({
                         'type': 'Startup Folder',
-                        'name': os.path.basename(file_path),
-                        'value': file_path,
+                        'name': entry.name,
+                        'value': entry.path,
                         'path': location
                     })
     return startup_items
@@ -133,9 +183,7 @@ def main():
     print("=" * 60)
 
     # 检查权限
-    try:
-        winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"Software")
-    except PermissionError:
+    if not is_admin():
         print("❌ 错误：请以管理员权限运行此脚本！")
         print("💡 右键 PyCharm 或脚本，选择“以管理员身份运行”")
         sys.exit(1)
@@ -158,21 +206,16 @@ def main():
     print("🚨 检查可疑启动项...")
     print("-" * 60)
 
-    suspicious_found = False
+    # 警告内容先缓存，检查结束后一次性输出
+    report = []
 
     for item in all_items:
         issues = []
 
         # 提取可执行路径（从注册表值或文件路径中解析）
         value = item['value']
-        exe_path = value
-        # 简单提取路径（如 "C:\xxx\abc.exe" 参数 -> 提取带exe的部分）
-        import re
-        match = re.search(r'(["\']?)([A-Za-z]:\\[^"\']+\.(exe|bat|vbs|ps1|cmd))\1', value)
-        if match:
-            exe_path = match.group(2)
-        else:
-            exe_path = value  # 保守处理
+        match = _EXE_PATH_RE.search(value)
+        exe_path = match.group(2) if match else value  # 未匹配时保守处理
 
         # 1. 检查高风险路径
         if is_high_risk_path(exe_path):
@@ -191,16 +234,15 @@ def main():
         if is_suspicious_name(item['name']):
             issues.append(f"疑似仿冒系统启动项: {item['name']}")
 
-        # 输出警告
+        # 记录警告
         if issues:
-            suspicious_found = True
-            print(f"⚠️  [{item['type']}] 名称: {item['name']}")
-            for issue in issues:
-                print(f"     🔸 {issue}")
+            report.append(f"⚠️  [{item['type']}] 名称: {item['name']}")
+            report.extend(f"     🔸 {issue}" for issue in issues)
 
-    if not suspicious_found:
+    if not report:
         print("✅ 未发现明显可疑的启动项。")
     else:
+        print("\n".join(report))
         print("\n🔔 建议：对上述启动项进行进一步调查，可通过任务管理器或注册表编辑器禁用。")
 
     print("\n" + "=" * 60)